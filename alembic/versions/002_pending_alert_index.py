@@ -0,0 +1,33 @@
+"""Replace sent_at index with a partial index for pending alerts.
+
+Revision ID: 002_pending_alert_index
+Revises: 001_initial_schema
+Create Date: 2025-01-15 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "002_pending_alert_index"
+down_revision: Union[str, None] = "001_initial_schema"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pending alerts are queried as WHERE sent_at IS NULL ORDER BY created_at
+    op.create_index(
+        "ix_alerts_pending_created",
+        "alerts",
+        ["created_at"],
+        postgresql_where=sa.text("sent_at IS NULL"),
+    )
+    op.drop_index("ix_alerts_sent_at", table_name="alerts")
+
+
+def downgrade() -> None:
+    op.create_index("ix_alerts_sent_at", "alerts", ["sent_at"])
+    op.drop_index("ix_alerts_pending_created", table_name="alerts")
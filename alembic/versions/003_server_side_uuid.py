@@ -0,0 +1,29 @@
+"""Generate positions/alerts primary keys server-side.
+
+Revision ID: 003_server_side_uuid
+Revises: 002_pending_alert_index
+Create Date: 2025-01-20 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "003_server_side_uuid"
+down_revision: Union[str, None] = "002_pending_alert_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # gen_random_uuid() is built in from PostgreSQL 13; pgcrypto covers older servers
+    op.execute("CREATE EXTENSION IF NOT EXISTS pgcrypto")
+    op.alter_column("positions", "id", server_default=sa.text("gen_random_uuid()"))
+    op.alter_column("alerts", "id", server_default=sa.text("gen_random_uuid()"))
+
+
+def downgrade() -> None:
+    op.alter_column("alerts", "id", server_default=None)
+    op.alter_column("positions", "id", server_default=None)
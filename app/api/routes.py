@@ -1,11 +1,11 @@
 """FastAPI routes for the strategy engine API."""
 import logging
 import uuid
-from datetime import date, datetime
+from datetime import date
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, update
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.database import get_db
@@ -32,6 +32,7 @@ async def health_check() -> HealthResponse:
 
 @router.post("/jobs/daily", response_model=DailyJobResponse)
 async def run_daily_job(
+    request: Request,
     as_of: Annotated[date, Query(description="Date to run the daily job for (YYYY-MM-DD)")],
     db: AsyncSession = Depends(get_db),
 ) -> DailyJobResponse:
@@ -43,18 +44,15 @@ async def run_daily_job(
     """
     logger.info(f"API: Running daily job for {as_of}")
 
-    fmp_client = FMPClient()
-    try:
-        engine = StrategyEngine(db, fmp_client)
-        new_entries, new_exits = await engine.run_daily_job(as_of)
+    fmp_client = FMPClient(request.app.state.http)
+    engine = StrategyEngine(db, fmp_client)
+    new_entries, new_exits = await engine.run_daily_job(as_of)
 
-        return DailyJobResponse(
-            as_of=as_of,
-            new_entry_alerts=new_entries,
-            new_exit_alerts=new_exits,
-        )
-    finally:
-        await fmp_client.close()
+    return DailyJobResponse(
+        as_of=as_of,
+        new_entry_alerts=new_entries,
+        new_exit_alerts=new_exits,
+    )
 
 
 @router.get("/alerts/pending", response_model=list[AlertResponse])
@@ -67,23 +65,26 @@ async def get_pending_alerts(
 
     Returns alerts where sent_at is NULL, ordered by created_at ascending.
     """
-    result = await db.execute(
-        select(Alert)
+    # Select only the response columns; plain rows skip ORM identity-map overhead.
+    # Rows are streamed in batches rather than buffered all at once.
+    result = await db.stream(
+        select(Alert.id, Alert.alert_type, Alert.symbol, Alert.as_of, Alert.message)
         .where(Alert.sent_at.is_(None))
         .order_by(Alert.created_at.asc())
         .limit(limit)
+        .execution_options(yield_per=100)
     )
-    alerts = result.scalars().all()
 
+    # Values come straight from typed DB columns, so skip pydantic validation
     return [
-        AlertResponse(
-            id=a.id,
-            alert_type=a.alert_type,
-            symbol=a.symbol,
-            as_of=a.as_of,
-            message=a.message,
+        AlertResponse.model_construct(
+            id=r.id,
+            alert_type=r.alert_type,
+            symbol=r.symbol,
+            as_of=r.as_of,
+            message=r.message,
         )
-        for a in alerts
+        async for r in result
     ]
 
 
@@ -98,30 +99,37 @@ async def mark_alert_sent(
     This endpoint is idempotent - calling it on an already-sent alert
     will return success with the existing sent_at timestamp.
     """
-    # Get the alert
-    result = await db.execute(select(Alert).where(Alert.id == alert_id))
-    alert = result.scalar_one_or_none()
-
-    if alert is None:
-        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    # Mark as sent in a single round-trip; only unsent alerts match
+    result = await db.execute(
+        update(Alert)
+        .where(Alert.id == alert_id, Alert.sent_at.is_(None))
+        .values(sent_at=func.now())
+        .returning(Alert.id, Alert.sent_at)
+    )
+    row = result.first()
 
-    # If already sent, return success with existing timestamp
-    if alert.sent_at is not None:
+    # sent_at comes from the DB clock. Commit before answering: get_db's own
+    # commit runs after the response is sent, too late to report a failure
+    if row is not None:
+        await db.commit()
         return MarkSentResponse(
             success=True,
-            id=alert.id,
-            sent_at=alert.sent_at,
+            id=row.id,
+            sent_at=row.sent_at,
         )
 
-    # Mark as sent
-    now = datetime.utcnow()
-    await db.execute(
-        update(Alert).where(Alert.id == alert_id).values(sent_at=now)
+    # Nothing updated: either already sent or not found
+    result = await db.execute(
+        select(Alert.id, Alert.sent_at).where(Alert.id == alert_id)
     )
-    await db.commit()
+    existing = result.first()
+
+    if existing is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
 
+    # Already sent, return success with existing timestamp
     return MarkSentResponse(
         success=True,
-        id=alert.id,
-        sent_at=now,
+        id=existing.id,
+        sent_at=existing.sent_at,
     )
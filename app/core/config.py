@@ -1,5 +1,5 @@
 """Application configuration using pydantic-settings."""
-from functools import lru_cache
+from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,16 +18,32 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str
+    # Per worker; the defaults cap 2 workers at 40 connections, well under
+    # PostgreSQL's default max_connections of 100 (97 for non-superusers)
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
 
     # Application
     app_name: str = "Strategy Engine"
     debug: bool = False
+    # Allowed CORS origins (JSON list); empty allows any origin
+    cors_origins: list[str] = []
+    # Each worker owns its own DB pool: keep workers * (pool + overflow) under
+    # the server's max_connections
+    workers: int = Field(
+        default=2,
+        validation_alias=AliasChoices("web_concurrency", "workers"),
+    )
 
     # SP500 cache TTL (hours)
     sp500_cache_ttl_hours: int = 24
 
 
-@lru_cache
+# Loaded once at import; prefer importing `settings` directly
+settings = Settings()
+
+
 def get_settings() -> Settings:
-    """Get cached settings instance."""
-    return Settings()
+    """Get the settings instance (kept for existing callers)."""
+    return settings
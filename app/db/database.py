@@ -1,4 +1,5 @@
 """Database connection and session management."""
+import asyncio
 from typing import AsyncGenerator, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine, AsyncEngine
@@ -26,12 +27,41 @@ def get_engine() -> AsyncEngine:
             settings.database_url,
             echo=settings.debug,
             pool_pre_ping=True,
-            pool_size=5,
-            max_overflow=10,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            # Drop long-idle connections before the server side does
+            pool_recycle=1800,
         )
     return _engine
 
 
+async def warm_pool() -> None:
+    """Open and release pool_size connections so the first request skips connect cost."""
+    from app.core.config import get_settings
+    engine = get_engine()
+    results = await asyncio.gather(
+        *(engine.connect() for _ in range(get_settings().db_pool_size)),
+        return_exceptions=True,
+    )
+    conns = [r for r in results if not isinstance(r, BaseException)]
+    # Closing returns each connection to the pool rather than dropping it
+    await asyncio.gather(*(c.close() for c in conns))
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        raise errors[0]
+
+
+async def dispose_engine() -> None:
+    """Close all pooled connections if the engine was created."""
+    global _engine, _async_session_maker
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _async_session_maker = None
+
+
 def get_session_maker() -> async_sessionmaker[AsyncSession]:
     """Get or create the async session maker."""
     global _async_session_maker
@@ -14,6 +14,7 @@ from sqlalchemy import (
     Text,
     UniqueConstraint,
     func,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
@@ -50,7 +51,7 @@ class Position(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
-        default=uuid.uuid4,
+        server_default=func.gen_random_uuid(),
     )
     symbol: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
     entry_date: Mapped[date] = mapped_column(Date, nullable=False)
@@ -89,7 +90,7 @@ class Alert(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
-        default=uuid.uuid4,
+        server_default=func.gen_random_uuid(),
     )
     event_key: Mapped[str] = mapped_column(Text, nullable=False, unique=True)
     alert_type: Mapped[str] = mapped_column(String(20), nullable=False)
@@ -106,7 +107,14 @@ class Alert(Base):
         nullable=True,
     )
 
-    __table_args__ = (Index("ix_alerts_sent_at", "sent_at"),)
+    __table_args__ = (
+        # Partial index serving the pending-alerts filter and ORDER BY in one scan
+        Index(
+            "ix_alerts_pending_created",
+            "created_at",
+            postgresql_where=text("sent_at IS NULL"),
+        ),
+    )
 
 
 class SymbolsCache(Base):
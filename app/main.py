@@ -1,8 +1,10 @@
 """FastAPI application entry point."""
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
 
+import httpx
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -19,13 +21,44 @@ logger.info(f"FMP_API_KEY set: {'FMP_API_KEY' in os.environ}")
 logger.info(f"DATABASE_URL set: {'DATABASE_URL' in os.environ}")
 logger.info("=========================")
 
+# Upper bound on startup pool warm-up; an unreachable DB host would otherwise
+# hold lifespan startup (and /health) for asyncpg's full connect timeout
+DB_WARMUP_TIMEOUT_SECONDS = 5.0
+
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     logger.info("Starting Strategy Engine")
-    yield
-    logger.info("Shutting down Strategy Engine")
+    # Single outbound HTTP client shared by all requests (keep-alive + HTTP/2)
+    app.state.http = httpx.AsyncClient(
+        timeout=30.0,
+        http2=True,
+        follow_redirects=True,
+        headers={"Accept-Encoding": "gzip"},
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+
+    # Pre-open DB connections; a failure or a slow DB must not block startup
+    try:
+        from app.db.database import warm_pool
+        await asyncio.wait_for(warm_pool(), timeout=DB_WARMUP_TIMEOUT_SECONDS)
+        logger.info("Database pool warmed")
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"Database pool warm-up timed out after {DB_WARMUP_TIMEOUT_SECONDS}s"
+        )
+    except Exception as e:
+        logger.warning(f"Failed to warm database pool: {e}")
+
+    try:
+        yield
+    finally:
+        from app.db.database import dispose_engine
+        await dispose_engine()
+        await app.state.http.aclose()
+        logger.info("Shutting down Strategy Engine")
 
 
 def create_app() -> FastAPI:
@@ -37,13 +70,21 @@ def create_app() -> FastAPI:
         lifespan=lifespan,
     )
 
+    # Explicit origins when configured; settings errors are reported below
+    cors_origins = ["*"]
+    try:
+        from app.core.config import get_settings
+        cors_origins = get_settings().cors_origins or ["*"]
+    except Exception:
+        pass
+
     # Add CORS middleware
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],
+        allow_origins=cors_origins,
         allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
+        allow_methods=["GET", "POST"],
+        allow_headers=["content-type", "authorization"],
     )
 
     # Health check that doesn't depend on settings
@@ -80,4 +121,17 @@ app = create_app()
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    from app.core.config import get_settings
+
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=get_settings().workers,
+        loop="uvloop",
+        http="httptools",
+        # Longer than typical client/LB idle timeouts so keep-alive sockets get reused
+        timeout_keep_alive=75,
+        # Keep the logging configured at the top of this module
+        log_config=None,
+    )
@@ -1,12 +1,15 @@
 """FMP (Financial Modeling Prep) API client with retry logic."""
 from __future__ import annotations
 
+import asyncio
 import logging
-from datetime import date
+import time
+from datetime import date, timedelta
 from decimal import Decimal
-from typing import Optional, Union
+from typing import Awaitable, Callable, Optional, TypeVar, Union
 
 import httpx
+import orjson
 from tenacity import (
     retry,
     retry_if_exception_type,
@@ -18,6 +21,21 @@ from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Resolved once at import; settings are immutable for the process lifetime
+_SETTINGS = get_settings()
+_API_KEY = _SETTINGS.fmp_api_key
+# Use stable API base URL
+_BASE_URL = "https://financialmodelingprep.com/stable"
+_SP500_CACHE_TTL_SECONDS = _SETTINGS.sp500_cache_ttl_hours * 3600
+
+# Trading days of history fetched for as_of close / previous-close lookups
+_PRICE_LOOKBACK = 20
+
+# In-process S&P500 constituents cache: (symbols, monotonic expiry)
+_sp500_cache: Optional[tuple[list[str], float]] = None
+
 
 class FMPClientError(Exception):
     """Base exception for FMP client errors."""
@@ -34,27 +52,22 @@ class FMPRateLimitError(FMPClientError):
 class FMPClient:
     """Client for FMP API with retry and backoff."""
 
-    def __init__(self) -> None:
-        self.settings = get_settings()
-        # Use stable API base URL
-        self.base_url = "https://financialmodelingprep.com/stable"
-        self.api_key = self.settings.fmp_api_key
-        self._client: Optional[httpx.AsyncClient] = None
-
-    async def _get_client(self) -> httpx.AsyncClient:
-        """Get or create HTTP client."""
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
-                timeout=httpx.Timeout(30.0),
-                follow_redirects=True,
-            )
-        return self._client
-
-    async def close(self) -> None:
-        """Close the HTTP client."""
-        if self._client is not None and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+    def __init__(self, client: httpx.AsyncClient) -> None:
+        self.base_url = _BASE_URL
+        self.api_key = _API_KEY
+        # Shared process-wide client, owned by the application lifespan
+        self._client = client
+        # Historical prices memoized per (symbol, as_of, timeseries) for this
+        # instance; the fetch window depends on timeseries, so it is part of the key
+        self._hist_cache: dict[tuple[str, date, int], list[dict]] = {}
+        self._hist_locks: dict[str, asyncio.Lock] = {}
+        # {date_str: position} per cached history, for O(1) date lookups
+        self._hist_by_date: dict[tuple[str, date, int], dict[str, int]] = {}
+
+    def clear_historical_cache(self) -> None:
+        """Drop memoized historical prices so the next lookups refetch from FMP."""
+        self._hist_cache.clear()
+        self._hist_by_date.clear()
 
     @retry(
         retry=retry_if_exception_type((httpx.HTTPStatusError, httpx.TimeoutException)),
@@ -64,30 +77,42 @@ class FMPClient:
     )
     async def _request(self, endpoint: str, params: Optional[dict] = None) -> Union[dict, list]:
         """Make a request to FMP API with retry logic."""
-        client = await self._get_client()
-        params = params or {}
-        params["apikey"] = self.api_key
+        # Build a fresh dict so the caller's params are never mutated across retries
+        params = {**(params or {}), "apikey": self.api_key}
 
         url = f"{self.base_url}/{endpoint}"
         logger.debug(f"FMP request: {url}")
 
-        response = await client.get(url, params=params)
+        response = await self._client.get(url, params=params)
 
         # Check for rate limit
         if response.status_code == 429:
             raise FMPRateLimitError("FMP API rate limit exceeded")
 
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def get_sp500_constituents(self) -> list[str]:
-        """Get list of S&P500 constituent symbols."""
+        """
+        Get list of S&P500 constituent symbols.
+
+        Results are cached in-process for sp500_cache_ttl_hours; empty
+        responses are not cached so the next call retries.
+        """
+        global _sp500_cache
+        if _sp500_cache is not None and time.monotonic() < _sp500_cache[1]:
+            return list(_sp500_cache[0])
+
         # Use stable endpoint: /stable/sp500-constituent
         data = await self._request("sp500-constituent")
         if not isinstance(data, list):
             logger.warning("Unexpected SP500 response format")
             return []
-        return [item.get("symbol") for item in data if item.get("symbol")]
+
+        symbols = [item.get("symbol") for item in data if item.get("symbol")]
+        if symbols:
+            _sp500_cache = (symbols, time.monotonic() + _SP500_CACHE_TTL_SECONDS)
+        return list(symbols)
 
     async def get_earnings_calendar(self, as_of: date) -> list[str]:
         """
@@ -95,7 +120,7 @@ class FMPClient:
 
         Returns list of symbols that have earnings announcement on as_of date.
         """
-        date_str = as_of.strftime("%Y-%m-%d")
+        date_str = as_of.isoformat()
         # Use stable endpoint: /stable/earnings-calendar
         data = await self._request(
             "earnings-calendar",
@@ -116,27 +141,64 @@ class FMPClient:
         return symbols
 
     async def get_historical_prices(
-        self, symbol: str, timeseries: int = 20
+        self, symbol: str, as_of: date, timeseries: int = 20
     ) -> list[dict]:
         """
-        Get historical daily prices for a symbol.
+        Get historical daily prices for a symbol up to as_of.
 
         Returns list of price data sorted by date (newest first).
         Each item has: date, open, high, low, close, volume, etc.
+        Only a window of ~2x timeseries calendar days ending at as_of is
+        requested. Responses are cached per (symbol, as_of, timeseries), so
+        repeated lookups on the same client only hit FMP once.
         """
-        # Use stable endpoint: /stable/historical-price-eod/full
-        data = await self._request(
-            f"historical-price-eod/full",
-            params={"symbol": symbol},
-        )
-
-        if not isinstance(data, list):
-            logger.warning(f"Unexpected historical price response format for {symbol}")
-            return []
+        cache_key = (symbol, as_of, timeseries)
+        async with self._hist_locks.setdefault(symbol, asyncio.Lock()):
+            data = self._hist_cache.get(cache_key)
+            if data is None:
+                # Calendar-day window wide enough to cover timeseries trading days
+                from_str = (as_of - timedelta(days=timeseries * 2)).isoformat()
+                # Use stable endpoint: /stable/historical-price-eod/full
+                data = await self._request(
+                    f"historical-price-eod/full",
+                    params={
+                        "symbol": symbol,
+                        "from": from_str,
+                        "to": as_of.isoformat(),
+                    },
+                )
+
+                if not isinstance(data, list):
+                    logger.warning(f"Unexpected historical price response format for {symbol}")
+                    return []
+
+                self._hist_cache[cache_key] = data
+                self._hist_by_date[cache_key] = {
+                    item.get("date"): i for i, item in enumerate(data)
+                }
 
         # Return only the requested number of records (newest first)
         return data[:timeseries]
 
+    def _find_date_index(
+        self,
+        symbol: str,
+        as_of: date,
+        timeseries: int,
+        historical: list[dict],
+        as_of_str: str,
+    ) -> Optional[int]:
+        """Find the position of as_of_str within historical, or None if absent."""
+        index = self._hist_by_date.get((symbol, as_of, timeseries))
+        if index is None:
+            index = {item.get("date"): i for i, item in enumerate(historical)}
+
+        # The index covers the full cached response; only accept hits in the window
+        as_of_idx = index.get(as_of_str)
+        if as_of_idx is None or as_of_idx >= len(historical):
+            return None
+        return as_of_idx
+
     async def get_price_data_for_date(
         self, symbol: str, as_of: date
     ) -> Optional[tuple[Decimal, Decimal]]:
@@ -147,19 +209,15 @@ class FMPClient:
             Tuple of (as_of_close, prev_trading_day_close) if found,
             None if as_of is not a trading day or data not available.
         """
-        historical = await self.get_historical_prices(symbol, timeseries=20)
+        historical = await self.get_historical_prices(symbol, as_of, timeseries=_PRICE_LOOKBACK)
 
         if not historical:
             return None
 
-        as_of_str = as_of.strftime("%Y-%m-%d")
-
-        # Find as_of date in the list
-        as_of_idx = None
-        for i, item in enumerate(historical):
-            if item.get("date") == as_of_str:
-                as_of_idx = i
-                break
+        as_of_str = as_of.isoformat()
+        as_of_idx = self._find_date_index(
+            symbol, as_of, _PRICE_LOOKBACK, historical, as_of_str
+        )
 
         if as_of_idx is None:
             # as_of date not found - not a trading day or data not updated
@@ -180,20 +238,67 @@ class FMPClient:
 
         return Decimal(str(as_of_close)), Decimal(str(prev_close))
 
+    async def _gather_bounded(
+        self,
+        symbols: list[str],
+        fetch: Callable[[str], Awaitable[T]],
+        concurrency: int,
+    ) -> dict[str, Optional[T]]:
+        """
+        Run fetch for every symbol with at most `concurrency` in flight at once.
+
+        Symbols whose lookup fails are logged and mapped to None.
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(symbol: str) -> T:
+            async with sem:
+                return await fetch(symbol)
+
+        results = await asyncio.gather(*(one(s) for s in symbols), return_exceptions=True)
+
+        values: dict[str, Optional[T]] = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error fetching price data for {symbol}: {result}")
+                values[symbol] = None
+            else:
+                values[symbol] = result
+        return values
+
+    async def get_price_data_bulk(
+        self, symbols: list[str], as_of: date, concurrency: int = 20
+    ) -> dict[str, Optional[tuple[Decimal, Decimal]]]:
+        """Get price data (see get_price_data_for_date) for many symbols concurrently."""
+        return await self._gather_bounded(
+            symbols, lambda s: self.get_price_data_for_date(s, as_of), concurrency
+        )
+
+    async def get_close_price_bulk(
+        self, symbols: list[str], as_of: date, concurrency: int = 20
+    ) -> dict[str, Optional[Decimal]]:
+        """Get closing prices (see get_close_price) for many symbols concurrently."""
+        return await self._gather_bounded(
+            symbols, lambda s: self.get_close_price(s, as_of), concurrency
+        )
+
     async def get_close_price(self, symbol: str, as_of: date) -> Optional[Decimal]:
         """Get closing price for a symbol on a specific date."""
-        historical = await self.get_historical_prices(symbol, timeseries=20)
+        historical = await self.get_historical_prices(symbol, as_of, timeseries=_PRICE_LOOKBACK)
 
         if not historical:
             return None
 
-        as_of_str = as_of.strftime("%Y-%m-%d")
+        as_of_str = as_of.isoformat()
+        as_of_idx = self._find_date_index(
+            symbol, as_of, _PRICE_LOOKBACK, historical, as_of_str
+        )
 
-        for item in historical:
-            if item.get("date") == as_of_str:
-                close = item.get("close")
-                if close is not None:
-                    return Decimal(str(close))
-                break
+        if as_of_idx is None:
+            return None
+
+        close = historical[as_of_idx].get("close")
+        if close is None:
+            return None
 
-        return None
+        return Decimal(str(close))
@@ -1,13 +1,16 @@
 """Strategy engine for entry/exit signal generation."""
+import itertools
 import logging
-from datetime import date, datetime, timedelta
+import time
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 from typing import Optional
 
-from sqlalchemy import select, update
+from sqlalchemy import Numeric, String, case, column, func, or_, select, text, update, values
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
 from app.db.models import Alert, AlertType, ExitReason, Position, PositionStatus, SymbolsCache
 from app.services.fmp_client import FMPClient
 
@@ -18,6 +21,63 @@ ENTRY_RETURN_MIN = Decimal("-0.30")  # -30%
 ENTRY_RETURN_MAX = Decimal("-0.05")  # -5%
 STOP_LOSS_THRESHOLD = Decimal("-0.10")  # -10%
 MAX_HOLDING_DAYS = 50
+# close <= entry * (1 + threshold) is equivalent to close / entry - 1 <= threshold
+STOP_LOSS_PRICE_RATIO = 1 + STOP_LOSS_THRESHOLD
+
+# Alert message prefix per exit reason
+_EXIT_PREFIX = {
+    ExitReason.STOP_LOSS.value: "[EXIT-STOP_LOSS]",
+    ExitReason.TIME_EXIT.value: "[EXIT-TIME_EXIT]",
+}
+
+# Above this many rows the symbols cache is rewritten with COPY instead of INSERT
+SYMBOLS_COPY_THRESHOLD = 100
+# Rows per multi-row INSERT, well under PostgreSQL's 65535 bind-parameter limit
+SYMBOLS_INSERT_BATCH_SIZE = 5000
+
+# Built once so every scan reuses the cached compiled form; executed with a
+# list of row dicts, which SQLAlchemy batches via insertmanyvalues
+POSITION_INSERT = (
+    insert(Position)
+    .on_conflict_do_nothing(index_elements=["symbol", "entry_date"])
+    .returning(Position.id)
+)
+ALERT_INSERT = (
+    insert(Alert)
+    .on_conflict_do_nothing(index_elements=["event_key"])
+    .returning(Alert.id)
+)
+
+# In-process memo of the DB symbols cache: (monotonic expiry, symbols)
+_symbols_memo: Optional[tuple[float, list[str]]] = None
+
+
+def build_entry_message(
+    symbol: str, as_of: date, earnings_return: Decimal, entry_price: Decimal
+) -> str:
+    """Format entry alert message for LINE notification."""
+    return (
+        f"[ENTRY] {symbol} {as_of.isoformat()}\n"
+        f"Earnings day return: {earnings_return * 100:.2f}%\n"
+        f"Entry price (close): {entry_price:.2f}"
+    )
+
+
+def build_exit_message(
+    symbol: str,
+    exit_date: date,
+    exit_reason: str,
+    pnl: Decimal,
+    exit_price: Decimal,
+    holding_days: int,
+) -> str:
+    """Format exit alert message for LINE notification."""
+    return (
+        f"{_EXIT_PREFIX[exit_reason]} {symbol} {exit_date.isoformat()}\n"
+        f"PnL: {pnl * 100:.2f}%\n"
+        f"Exit price (close): {exit_price:.2f}\n"
+        f"Holding days: {holding_days}"
+    )
 
 
 class StrategyEngine:
@@ -26,90 +86,224 @@ class StrategyEngine:
     def __init__(self, db: AsyncSession, fmp_client: FMPClient) -> None:
         self.db = db
         self.fmp = fmp_client
+        self._cache_ttl = timedelta(hours=get_settings().sp500_cache_ttl_hours)
 
     async def get_sp500_symbols(self) -> list[str]:
         """
         Get S&P500 symbols, using cache if available.
-        Cache is stored in DB to persist across restarts.
+        Cache is stored in DB to persist across restarts, and memoized
+        in-process until the DB cache would expire.
         """
-        from app.core.config import get_settings
+        global _symbols_memo
+        if _symbols_memo is not None and time.monotonic() < _symbols_memo[0]:
+            return list(_symbols_memo[1])
 
-        settings = get_settings()
-        cache_ttl = timedelta(hours=settings.sp500_cache_ttl_hours)
-
-        # Check cache
-        result = await self.db.execute(select(SymbolsCache))
-        cached = result.scalars().all()
+        # Check cache age without loading the rows
+        result = await self.db.execute(
+            select(func.min(SymbolsCache.updated_at), func.count())
+        )
+        oldest, cached_count = result.one()
 
-        if cached:
+        if cached_count:
             # Check if cache is still valid
-            oldest = min(c.updated_at for c in cached)
-            if datetime.now(oldest.tzinfo) - oldest < cache_ttl:
-                logger.info(f"Using cached SP500 symbols ({len(cached)} symbols)")
-                return [c.symbol for c in cached]
+            age = datetime.now(oldest.tzinfo) - oldest
+            if age < self._cache_ttl:
+                symbols = await self._load_cached_symbols()
+                logger.info(f"Using cached SP500 symbols ({len(symbols)} symbols)")
+                remaining = (self._cache_ttl - age).total_seconds()
+                _symbols_memo = (time.monotonic() + remaining, symbols)
+                return list(symbols)
 
         # Fetch fresh data
         logger.info("Fetching fresh SP500 symbols from FMP")
         symbols = await self.fmp.get_sp500_constituents()
 
         if not symbols:
-            # If fetch fails, use existing cache if available
-            if cached:
+            # If fetch fails, use existing cache if available (not memoized, so we retry)
+            if cached_count:
                 logger.warning("FMP fetch failed, using stale cache")
-                return [c.symbol for c in cached]
+                return await self._load_cached_symbols()
             return []
 
+        try:
+            await self._replace_symbols_cache(symbols)
+            await self.db.commit()
+        except Exception:
+            _symbols_memo = None
+            raise
+
+        _symbols_memo = (time.monotonic() + self._cache_ttl.total_seconds(), symbols)
+        logger.info(f"Cached {len(symbols)} SP500 symbols")
+        return list(symbols)
+
+    async def _load_cached_symbols(self) -> list[str]:
+        """Load cached symbols as plain column values."""
+        result = await self.db.execute(select(SymbolsCache.symbol))
+        return list(result.scalars().all())
+
+    async def _replace_symbols_cache(self, symbols: list[str]) -> None:
+        """Replace the symbols cache contents in as few round-trips as possible."""
         # Update cache - delete old and insert new
         await self.db.execute(SymbolsCache.__table__.delete())
 
-        for symbol in symbols:
-            stmt = insert(SymbolsCache).values(
-                symbol=symbol,
-                updated_at=datetime.utcnow(),
+        now = datetime.now(timezone.utc)
+
+        if len(symbols) > SYMBOLS_COPY_THRESHOLD:
+            # COPY on the session's own connection, so it shares the DELETE's transaction
+            conn = await self.db.connection()
+            raw = await conn.get_raw_connection()
+            copy_records = getattr(raw.driver_connection, "copy_records_to_table", None)
+            if copy_records is not None:
+                await copy_records(
+                    SymbolsCache.__tablename__,
+                    records=[(symbol, now) for symbol in symbols],
+                    columns=["symbol", "updated_at"],
+                )
+                return
+
+        # One multi-row INSERT per batch (also the fallback for non-asyncpg drivers)
+        it = iter(symbols)
+        while batch := list(itertools.islice(it, SYMBOLS_INSERT_BATCH_SIZE)):
+            await self.db.execute(
+                insert(SymbolsCache).values(
+                    [{"symbol": symbol, "updated_at": now} for symbol in batch]
+                )
             )
-            await self.db.execute(stmt)
 
-        await self.db.commit()
-        logger.info(f"Cached {len(symbols)} SP500 symbols")
-        return symbols
+    async def persist_positions(self, positions: list[dict]) -> int:
+        """
+        Insert positions in one statement, skipping existing (symbol, entry_date).
 
-    def _generate_entry_event_key(self, symbol: str, entry_date: date) -> str:
-        """Generate unique event key for entry alert."""
-        return f"ENTRY|{symbol}|{entry_date.isoformat()}"
+        Returns number of positions actually inserted.
+        """
+        if not positions:
+            return 0
 
-    def _generate_exit_event_key(
-        self, symbol: str, entry_date: date, exit_date: date, exit_reason: str
-    ) -> str:
-        """Generate unique event key for exit alert."""
-        return f"EXIT|{symbol}|{entry_date.isoformat()}|{exit_date.isoformat()}|{exit_reason}"
+        result = await self.db.execute(POSITION_INSERT, positions)
+        return len(result.scalars().all())
 
-    def _format_entry_message(
-        self, symbol: str, as_of: date, earnings_return: Decimal, entry_price: Decimal
-    ) -> str:
-        """Format entry alert message for LINE notification."""
-        return (
-            f"[ENTRY] {symbol} {as_of.isoformat()}\n"
-            f"Earnings day return: {earnings_return * 100:.2f}%\n"
-            f"Entry price (close): {entry_price:.2f}"
+    async def _close_triggered_positions(
+        self, as_of: date, close_map: dict[str, Optional[Decimal]]
+    ) -> list[tuple]:
+        """
+        Close open positions that hit the stop loss or the holding limit.
+
+        The close prices are sent as an inline VALUES relation and joined in a
+        single UPDATE ... FROM, so exit detection runs in PostgreSQL.
+
+        Returns list of (id, symbol, entry_date, entry_price, exit_price, exit_reason)
+        for the positions that were closed.
+        """
+        rows = [(symbol, close) for symbol, close in close_map.items() if close is not None]
+        if not rows:
+            return []
+
+        prices = values(
+            column("symbol", String),
+            column("close", Numeric),
+            name="prices",
+        ).data(rows)
+
+        # Holding days >= MAX_HOLDING_DAYS is an entry date on or before the cutoff
+        stop_loss = prices.c.close <= Position.entry_price * STOP_LOSS_PRICE_RATIO
+        time_exit = Position.entry_date <= as_of - timedelta(days=MAX_HOLDING_DAYS)
+
+        result = await self.db.execute(
+            update(Position)
+            .where(
+                Position.symbol == prices.c.symbol,
+                Position.status == PositionStatus.OPEN.value,
+                or_(stop_loss, time_exit),
+            )
+            .values(
+                status=PositionStatus.CLOSED.value,
+                exit_date=as_of,
+                exit_price=prices.c.close,
+                exit_reason=case(
+                    (stop_loss, ExitReason.STOP_LOSS.value),
+                    else_=ExitReason.TIME_EXIT.value,
+                ),
+            )
+            .returning(
+                Position.id,
+                Position.symbol,
+                Position.entry_date,
+                Position.entry_price,
+                Position.exit_price,
+                Position.exit_reason,
+            )
+            .execution_options(synchronize_session=False)
         )
+        return [tuple(row) for row in result.all()]
 
-    def _format_exit_message(
-        self,
-        symbol: str,
-        exit_date: date,
-        exit_reason: str,
-        pnl: Decimal,
-        exit_price: Decimal,
-        holding_days: int,
+    async def persist_alerts(self, alerts: list[dict]) -> int:
+        """
+        Insert alerts in one statement, skipping existing event keys.
+
+        Returns number of alerts actually inserted.
+        """
+        if not alerts:
+            return 0
+
+        result = await self.db.execute(ALERT_INSERT, alerts)
+        return len(result.scalars().all())
+
+    async def _relax_commit_durability(self) -> None:
+        """
+        Skip the WAL flush wait when the current transaction commits.
+
+        Scan writes are idempotent (alerts by event_key, positions by
+        (symbol, entry_date)), so a re-run regenerates anything lost in a crash.
+        SET LOCAL only lasts until the end of the current transaction.
+        """
+        await self.db.execute(text("SET LOCAL synchronous_commit = OFF"))
+
+    def _generate_entry_event_key(self, symbol: str, entry_date_iso: str) -> str:
+        """Generate unique event key for entry alert from an ISO entry date."""
+        return f"ENTRY|{symbol}|{entry_date_iso}"
+
+    def _generate_exit_event_key(
+        self, symbol: str, entry_date_iso: str, exit_date_iso: str, exit_reason: str
     ) -> str:
-        """Format exit alert message for LINE notification."""
-        reason_label = "STOP_LOSS" if exit_reason == ExitReason.STOP_LOSS.value else "TIME_EXIT"
-        return (
-            f"[EXIT-{reason_label}] {symbol} {exit_date.isoformat()}\n"
-            f"PnL: {pnl * 100:.2f}%\n"
-            f"Exit price (close): {exit_price:.2f}\n"
-            f"Holding days: {holding_days}"
+        """Generate unique event key for exit alert from ISO entry/exit dates."""
+        return f"EXIT|{symbol}|{entry_date_iso}|{exit_date_iso}|{exit_reason}"
+
+    async def _select_entry_signals(
+        self, price_map: dict[str, Optional[tuple[Decimal, Decimal]]]
+    ) -> list[tuple[str, Decimal, Decimal]]:
+        """
+        Filter fetched prices to SP500 symbols whose earnings return is in range.
+
+        The prices are sent as an inline VALUES relation joined to symbols_cache,
+        so membership and the return bounds are evaluated by PostgreSQL.
+
+        Returns list of (symbol, as_of_close, earnings_return).
+        """
+        # A non-positive prev_close would make PostgreSQL raise division by zero
+        # and abort the scan; drop those rows here, since a WHERE guard does not
+        # control evaluation order
+        rows = [
+            (symbol, data[0], data[1])
+            for symbol, data in price_map.items()
+            if data is not None and data[1] > 0
+        ]
+        if not rows:
+            return []
+
+        prices = values(
+            column("symbol", String),
+            column("close", Numeric),
+            column("prev_close", Numeric),
+            name="prices",
+        ).data(rows)
+        earnings_return = prices.c.close / prices.c.prev_close - 1
+
+        result = await self.db.execute(
+            select(prices.c.symbol, prices.c.close, earnings_return.label("earnings_return"))
+            .join(SymbolsCache, SymbolsCache.symbol == prices.c.symbol)
+            .where(earnings_return.between(ENTRY_RETURN_MIN, ENTRY_RETURN_MAX))
         )
+        return [tuple(row) for row in result.all()]
 
     async def scan_entries(self, as_of: date) -> int:
         """
@@ -123,81 +317,76 @@ class StrategyEngine:
         Returns number of new entry alerts created.
         """
         logger.info(f"Scanning entries for {as_of}")
-        new_alerts = 0
+
+        # Get earnings calendar for as_of first; most days have none, and then
+        # the SP500 cache lookup/refresh can be skipped entirely
+        earnings_symbols = await self.fmp.get_earnings_calendar(as_of)
+        logger.info(f"Found {len(earnings_symbols)} symbols with earnings on {as_of}")
+        if not earnings_symbols:
+            return 0
 
         # Get SP500 symbols
-        sp500_symbols = set(await self.get_sp500_symbols())
+        sp500_symbols = frozenset(await self.get_sp500_symbols())
         if not sp500_symbols:
             logger.warning("No SP500 symbols available")
             return 0
 
-        # Get earnings calendar for as_of
-        earnings_symbols = await self.fmp.get_earnings_calendar(as_of)
-        logger.info(f"Found {len(earnings_symbols)} symbols with earnings on {as_of}")
-
         # Filter to SP500 only
-        candidates = [s for s in earnings_symbols if s in sp500_symbols]
+        # Alerts are keyed by event_key, so candidate order does not matter
+        candidates = list(frozenset(earnings_symbols) & sp500_symbols)
         logger.info(f"Filtered to {len(candidates)} SP500 symbols with earnings")
+        if not candidates:
+            return 0
 
-        for symbol in candidates:
-            try:
-                # Get price data
-                price_data = await self.fmp.get_price_data_for_date(symbol, as_of)
-                if price_data is None:
-                    logger.debug(f"{symbol}: No price data for {as_of}, skipping")
-                    continue
-
-                as_of_close, prev_close = price_data
-
-                # Calculate earnings day return
-                earnings_return = as_of_close / prev_close - 1
+        # Fetch price data for all candidates concurrently
+        price_map = await self.fmp.get_price_data_bulk(candidates, as_of)
 
-                # Check entry condition
-                if not (ENTRY_RETURN_MIN <= earnings_return <= ENTRY_RETURN_MAX):
-                    logger.debug(
-                        f"{symbol}: Earnings return {earnings_return:.2%} outside range, skipping"
-                    )
-                    continue
+        # Membership and return-range checks run in one query over the fetched prices
+        signals = await self._select_entry_signals(price_map)
+        logger.info(f"{len(signals)} symbols within entry return range")
 
+        # Per-symbol lines are formatted lazily and skipped entirely when INFO is off
+        if logger.isEnabledFor(logging.INFO):
+            for symbol, as_of_close, earnings_return in signals:
                 logger.info(
-                    f"{symbol}: Entry signal - earnings return {earnings_return:.2%}, "
-                    f"entry price {as_of_close}"
+                    "%s: Entry signal - earnings return %.2f%%, entry price %s",
+                    symbol,
+                    earnings_return * 100,
+                    as_of_close,
                 )
 
-                # Create position (if not exists)
-                position_stmt = insert(Position).values(
-                    symbol=symbol,
-                    entry_date=as_of,
-                    entry_price=as_of_close,
-                    status=PositionStatus.OPEN.value,
-                )
-                position_stmt = position_stmt.on_conflict_do_nothing(
-                    index_elements=["symbol", "entry_date"]
-                )
-                await self.db.execute(position_stmt)
-
-                # Create alert (if not exists)
-                event_key = self._generate_entry_event_key(symbol, as_of)
-                message = self._format_entry_message(
+        # Build all rows in one pass; loop-invariant values are bound once
+        as_of_iso = as_of.isoformat()
+        open_status = PositionStatus.OPEN.value
+        entry_type = AlertType.ENTRY.value
+        position_rows = [
+            {
+                "symbol": symbol,
+                "entry_date": as_of,
+                "entry_price": as_of_close,
+                "status": open_status,
+            }
+            for symbol, as_of_close, _ in signals
+        ]
+        alert_rows = [
+            {
+                "event_key": self._generate_entry_event_key(symbol, as_of_iso),
+                "alert_type": entry_type,
+                "symbol": symbol,
+                "as_of": as_of,
+                "message": build_entry_message(
                     symbol, as_of, earnings_return, as_of_close
-                )
-
-                alert_stmt = insert(Alert).values(
-                    event_key=event_key,
-                    alert_type=AlertType.ENTRY.value,
-                    symbol=symbol,
-                    as_of=as_of,
-                    message=message,
-                )
-                alert_stmt = alert_stmt.on_conflict_do_nothing(index_elements=["event_key"])
-                result = await self.db.execute(alert_stmt)
+                ),
+            }
+            for symbol, as_of_close, earnings_return in signals
+        ]
 
-                if result.rowcount > 0:
-                    new_alerts += 1
+        # Set after the SP500 lookup, whose cache refresh commits on its own
+        await self._relax_commit_durability()
 
-            except Exception as e:
-                logger.error(f"Error processing {symbol}: {e}")
-                continue
+        # Create positions and alerts (if not exists) in one round-trip each
+        await self.persist_positions(position_rows)
+        new_alerts = await self.persist_alerts(alert_rows)
 
         await self.db.commit()
         logger.info(f"Entry scan complete: {new_alerts} new alerts")
@@ -214,87 +403,56 @@ class StrategyEngine:
         Returns number of new exit alerts created.
         """
         logger.info(f"Scanning exits for {as_of}")
-        new_alerts = 0
+        await self._relax_commit_durability()
 
-        # Get all open positions
+        # Only the distinct held symbols are needed to price the portfolio
         result = await self.db.execute(
-            select(Position).where(Position.status == PositionStatus.OPEN.value)
+            select(Position.symbol)
+            .where(Position.status == PositionStatus.OPEN.value)
+            .distinct()
         )
-        open_positions = result.scalars().all()
-        logger.info(f"Found {len(open_positions)} open positions")
-
-        for position in open_positions:
-            try:
-                # Get current close price
-                close_price = await self.fmp.get_close_price(position.symbol, as_of)
-                if close_price is None:
-                    logger.debug(
-                        f"{position.symbol}: No price data for {as_of}, skipping exit check"
-                    )
-                    continue
-
-                # Calculate metrics
-                holding_days = (as_of - position.entry_date).days
-                pnl = close_price / position.entry_price - 1
-
-                exit_reason: Optional[str] = None
-
-                # Check exit conditions
-                if pnl <= STOP_LOSS_THRESHOLD:
-                    exit_reason = ExitReason.STOP_LOSS.value
-                    logger.info(
-                        f"{position.symbol}: Stop loss triggered - PnL {pnl:.2%}"
-                    )
-                elif holding_days >= MAX_HOLDING_DAYS:
-                    exit_reason = ExitReason.TIME_EXIT.value
-                    logger.info(
-                        f"{position.symbol}: Time exit - {holding_days} days held"
-                    )
-
-                if exit_reason is None:
-                    continue
-
-                # Update position
-                await self.db.execute(
-                    update(Position)
-                    .where(Position.id == position.id)
-                    .values(
-                        status=PositionStatus.CLOSED.value,
-                        exit_date=as_of,
-                        exit_price=close_price,
-                        exit_reason=exit_reason,
-                    )
-                )
-
-                # Create alert (if not exists)
-                event_key = self._generate_exit_event_key(
-                    position.symbol, position.entry_date, as_of, exit_reason
-                )
-                message = self._format_exit_message(
-                    position.symbol,
-                    as_of,
-                    exit_reason,
-                    pnl,
-                    close_price,
-                    holding_days,
-                )
-
-                alert_stmt = insert(Alert).values(
-                    event_key=event_key,
-                    alert_type=AlertType.EXIT.value,
-                    symbol=position.symbol,
-                    as_of=as_of,
-                    message=message,
-                )
-                alert_stmt = alert_stmt.on_conflict_do_nothing(index_elements=["event_key"])
-                result = await self.db.execute(alert_stmt)
-
-                if result.rowcount > 0:
-                    new_alerts += 1
+        held_symbols = list(result.scalars().all())
+        logger.info(f"Found {len(held_symbols)} symbols with open positions")
+
+        # Fetch close prices for all held symbols concurrently
+        close_map = await self.fmp.get_close_price_bulk(held_symbols, as_of)
+
+        # Close every triggered position in one statement and get the rows back
+        closed = await self._close_triggered_positions(as_of, close_map)
+
+        as_of_iso = as_of.isoformat()
+        exit_type = AlertType.EXIT.value
+        alert_rows: list[dict] = []
+        for _, symbol, entry_date, entry_price, exit_price, exit_reason in closed:
+            holding_days = (as_of - entry_date).days
+            pnl = exit_price / entry_price - 1
+
+            if exit_reason == ExitReason.STOP_LOSS.value:
+                logger.info("%s: Stop loss triggered - PnL %.2f%%", symbol, pnl * 100)
+            else:
+                logger.info("%s: Time exit - %d days held", symbol, holding_days)
+
+            alert_rows.append(
+                {
+                    "event_key": self._generate_exit_event_key(
+                        symbol, entry_date.isoformat(), as_of_iso, exit_reason
+                    ),
+                    "alert_type": exit_type,
+                    "symbol": symbol,
+                    "as_of": as_of,
+                    "message": build_exit_message(
+                        symbol,
+                        as_of,
+                        exit_reason,
+                        pnl,
+                        exit_price,
+                        holding_days,
+                    ),
+                }
+            )
 
-            except Exception as e:
-                logger.error(f"Error processing exit for {position.symbol}: {e}")
-                continue
+        # Create alerts (if not exists) in one round-trip
+        new_alerts = await self.persist_alerts(alert_rows)
 
         await self.db.commit()
         logger.info(f"Exit scan complete: {new_alerts} new alerts")
@@ -308,6 +466,9 @@ class StrategyEngine:
         """
         logger.info(f"Running daily job for {as_of}")
 
+        # Entry and exit scans share one historical-price memo for this run
+        self.fmp.clear_historical_cache()
+
         new_entries = await self.scan_entries(as_of)
         new_exits = await self.scan_exits(as_of)
 
@@ -1,51 +1,89 @@
 """Tests for strategy engine logic."""
 import uuid
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from hypothesis import example, given
+from hypothesis import strategies as st
+from sqlalchemy.dialects import postgresql
 
 # Import strategy constants
+from app.services import strategy_engine as strategy_engine_module
 from app.services.strategy_engine import (
     ENTRY_RETURN_MAX,
     ENTRY_RETURN_MIN,
     MAX_HOLDING_DAYS,
+    STOP_LOSS_PRICE_RATIO,
     STOP_LOSS_THRESHOLD,
     StrategyEngine,
+    build_entry_message,
+    build_exit_message,
 )
 
+# Strategy bounds in integer basis points, for the fixed truth tables
+# (test_entry_return_bounds pins the Decimal values)
+ENTRY_RETURN_MIN_BP = int(ENTRY_RETURN_MIN * 10000)
+ENTRY_RETURN_MAX_BP = int(ENTRY_RETURN_MAX * 10000)
+STOP_LOSS_THRESHOLD_BP = int(STOP_LOSS_THRESHOLD * 10000)
+
+# Returns / PnL used by the message tables, keyed by percent and parsed once
+# at import
+_ER = {
+    k: Decimal(v)
+    for k, v in {
+        "-10.12": "-0.1012",
+        "-12.34": "-0.1234",
+        "5": "0.05",
+    }.items()
+}
+
 
 class TestEntryConditions:
     """Tests for entry signal conditions."""
 
+    pytestmark = pytest.mark.xdist_group(name="entry_conditions")
+
     def test_entry_return_bounds(self):
         """Test that entry return bounds are correctly defined."""
         assert ENTRY_RETURN_MIN == Decimal("-0.30")  # -30%
         assert ENTRY_RETURN_MAX == Decimal("-0.05")  # -5%
 
-    @pytest.mark.parametrize(
-        "earnings_return,should_trigger",
-        [
-            (Decimal("-0.30"), True),   # Exactly at lower bound
-            (Decimal("-0.05"), True),   # Exactly at upper bound
-            (Decimal("-0.15"), True),   # Middle of range
-            (Decimal("-0.10"), True),   # -10%
-            (Decimal("-0.25"), True),   # -25%
-            (Decimal("-0.31"), False),  # Below lower bound
-            (Decimal("-0.04"), False),  # Above upper bound
-            (Decimal("0.00"), False),   # No change
-            (Decimal("0.10"), False),   # Positive return
-            (Decimal("-0.50"), False),  # Too negative
-        ],
+    def test_entry_return_bounds_basis_points(self):
+        """Test that the basis-point bounds round-trip the Decimal constants."""
+        assert ENTRY_RETURN_MIN_BP == -3000
+        assert ENTRY_RETURN_MAX_BP == -500
+        assert Decimal(ENTRY_RETURN_MIN_BP) / 10000 == ENTRY_RETURN_MIN
+        assert Decimal(ENTRY_RETURN_MAX_BP) / 10000 == ENTRY_RETURN_MAX
+
+    @given(
+        prev_cents=st.integers(min_value=1, max_value=10**7),
+        close_cents=st.integers(min_value=0, max_value=10**7),
     )
-    def test_entry_condition_range(self, earnings_return: Decimal, should_trigger: bool):
-        """Test entry condition for various earnings returns."""
-        result = ENTRY_RETURN_MIN <= earnings_return <= ENTRY_RETURN_MAX
-        assert result == should_trigger, (
-            f"Earnings return {earnings_return} should "
-            f"{'trigger' if should_trigger else 'not trigger'} entry"
-        )
+    @example(prev_cents=10000, close_cents=7000)  # Exactly -30%
+    @example(prev_cents=10000, close_cents=9500)  # Exactly -5%
+    @example(prev_cents=10000, close_cents=6999)  # Just below -30%
+    @example(prev_cents=10000, close_cents=9501)  # Just above -5%
+    def test_entry_condition_range(self, prev_cents: int, close_cents: int):
+        """Test the engine's return-range check against fixed -30%/-5% bounds in integers."""
+        prev_close = Decimal(prev_cents) / 100
+        as_of_close = Decimal(close_cents) / 100
+        # Same expression the entry query evaluates
+        in_range = ENTRY_RETURN_MIN <= as_of_close / prev_close - 1 <= ENTRY_RETURN_MAX
+
+        change = (close_cents - prev_cents) * 100
+        assert in_range == (-30 * prev_cents <= change <= -5 * prev_cents)
+
+    def test_entry_condition_table(self):
+        """Test the entry bounds against a fixed truth table in one pass."""
+        earnings_returns_bp = [-3000, -500, -1500, -1000, -2500, -3100, -400, 0, 1000, -5000]
+        # In range (bounds inclusive), then below/above/flat/positive/too negative
+        expected = [True] * 5 + [False] * 5
+
+        got = [ENTRY_RETURN_MIN_BP <= bp <= ENTRY_RETURN_MAX_BP for bp in earnings_returns_bp]
+        assert got == expected
 
     def test_entry_price_calculation(self):
         """Test earnings day return calculation."""
@@ -61,47 +99,40 @@ class TestEntryConditions:
 class TestExitConditions:
     """Tests for exit signal conditions."""
 
+    pytestmark = pytest.mark.xdist_group(name="exit_conditions")
+
     def test_exit_thresholds(self):
         """Test that exit thresholds are correctly defined."""
         assert STOP_LOSS_THRESHOLD == Decimal("-0.10")  # -10%
         assert MAX_HOLDING_DAYS == 50
+        assert STOP_LOSS_THRESHOLD_BP == -1000
 
-    @pytest.mark.parametrize(
-        "pnl,should_stop_loss",
-        [
-            (Decimal("-0.10"), True),   # Exactly at threshold
-            (Decimal("-0.11"), True),   # Below threshold
-            (Decimal("-0.20"), True),   # Way below threshold
-            (Decimal("-0.09"), False),  # Above threshold
-            (Decimal("0.00"), False),   # Breakeven
-            (Decimal("0.10"), False),   # Profit
-        ],
-    )
-    def test_stop_loss_condition(self, pnl: Decimal, should_stop_loss: bool):
-        """Test stop loss condition for various PnL values."""
-        result = pnl <= STOP_LOSS_THRESHOLD
-        assert result == should_stop_loss, (
-            f"PnL {pnl} should {'trigger' if should_stop_loss else 'not trigger'} stop loss"
-        )
-
-    @pytest.mark.parametrize(
-        "holding_days,should_time_exit",
-        [
-            (50, True),   # Exactly at threshold
-            (51, True),   # Above threshold
-            (100, True),  # Way above threshold
-            (49, False),  # Below threshold
-            (0, False),   # Day of entry
-            (25, False),  # Half way
-        ],
+    @given(
+        entry_cents=st.integers(min_value=1, max_value=10**7),
+        exit_cents=st.integers(min_value=0, max_value=10**7),
     )
-    def test_time_exit_condition(self, holding_days: int, should_time_exit: bool):
-        """Test time exit condition for various holding periods."""
-        result = holding_days >= MAX_HOLDING_DAYS
-        assert result == should_time_exit, (
-            f"Holding days {holding_days} should "
-            f"{'trigger' if should_time_exit else 'not trigger'} time exit"
-        )
+    @example(entry_cents=10000, exit_cents=9000)  # Exactly -10%
+    @example(entry_cents=10000, exit_cents=8999)  # Just below
+    @example(entry_cents=10000, exit_cents=9001)  # Just above
+    def test_stop_loss_condition(self, entry_cents: int, exit_cents: int):
+        """Test the engine's stop-loss price bound against a fixed -10% in integers."""
+        entry_price = Decimal(entry_cents) / 100
+        exit_price = Decimal(exit_cents) / 100
+        # Same expression the exit UPDATE evaluates
+        stop_loss = exit_price <= entry_price * STOP_LOSS_PRICE_RATIO
+
+        assert stop_loss == ((exit_cents - entry_cents) * 100 <= -10 * entry_cents)
+
+    @given(st.integers(min_value=0, max_value=400))
+    @example(MAX_HOLDING_DAYS)  # Exactly at threshold
+    @example(MAX_HOLDING_DAYS - 1)  # Below threshold
+    @example(0)  # Day of entry
+    def test_time_exit_condition(self, holding_days: int):
+        """Test that holding days >= limit matches the entry-date cutoff used in SQL."""
+        as_of = date(2025, 12, 20)
+        entry_date = as_of - timedelta(days=holding_days)
+        cutoff = as_of - timedelta(days=MAX_HOLDING_DAYS)
+        assert (holding_days >= MAX_HOLDING_DAYS) == (entry_date <= cutoff)
 
     def test_pnl_calculation(self):
         """Test PnL calculation."""
@@ -112,6 +143,17 @@ class TestExitConditions:
         assert pnl == Decimal("-0.10")
         assert pnl <= STOP_LOSS_THRESHOLD
 
+    def test_stop_loss_price_bound_matches_pnl(self):
+        """Test that the price-bound stop loss check agrees with the PnL check."""
+        entry_price = Decimal("100.00")
+        exit_prices = [Decimal("90.00"), Decimal("89.99"), Decimal("90.01")]
+        # Exactly -10%, just below, just above
+        expected = [True, True, False]
+
+        bound = entry_price * STOP_LOSS_PRICE_RATIO
+        assert [price <= bound for price in exit_prices] == expected
+        assert [price / entry_price - 1 <= STOP_LOSS_THRESHOLD for price in exit_prices] == expected
+
     def test_holding_days_calculation(self):
         """Test holding days calculation (calendar days)."""
         entry_date = date(2025, 1, 1)
@@ -122,130 +164,441 @@ class TestExitConditions:
         assert holding_days >= MAX_HOLDING_DAYS
 
 
+# (kind, symbol, entry_date, exit_date, exit_reason, expected key); unused
+# fields are None. Rows differ in exactly one field from a neighbour, so a
+# helper that drops a field yields a duplicate key
+KEY_CASES = [
+    ("ENTRY", "AAPL", "2025-12-01", None, None, "ENTRY|AAPL|2025-12-01"),
+    ("ENTRY", "AAPL", "2025-12-02", None, None, "ENTRY|AAPL|2025-12-02"),
+    ("ENTRY", "MSFT", "2025-12-01", None, None, "ENTRY|MSFT|2025-12-01"),
+    (
+        "EXIT", "AAPL", "2025-12-01", "2025-12-20", "STOP_LOSS",
+        "EXIT|AAPL|2025-12-01|2025-12-20|STOP_LOSS",
+    ),
+    (
+        "EXIT", "AAPL", "2025-12-01", "2025-12-20", "TIME_EXIT",
+        "EXIT|AAPL|2025-12-01|2025-12-20|TIME_EXIT",
+    ),
+    (
+        "EXIT", "AAPL", "2025-12-01", "2025-12-21", "STOP_LOSS",
+        "EXIT|AAPL|2025-12-01|2025-12-21|STOP_LOSS",
+    ),
+    (
+        "EXIT", "AAPL", "2025-11-28", "2025-12-20", "STOP_LOSS",
+        "EXIT|AAPL|2025-11-28|2025-12-20|STOP_LOSS",
+    ),
+    (
+        "EXIT", "MSFT", "2025-12-01", "2025-12-20", "STOP_LOSS",
+        "EXIT|MSFT|2025-12-01|2025-12-20|STOP_LOSS",
+    ),
+]
+
+
+def _generate_key(engine: StrategyEngine, case: tuple) -> str:
+    """Build the event key for a KEY_CASES row with the engine's helpers."""
+    kind, symbol, entry_iso, exit_iso, exit_reason, _ = case
+    if kind == "ENTRY":
+        return engine._generate_entry_event_key(symbol, entry_iso)
+    return engine._generate_exit_event_key(symbol, entry_iso, exit_iso, exit_reason)
+
+
 class TestEventKeyIdempotency:
     """Tests for event key generation and idempotency."""
 
-    def test_entry_event_key_format(self):
-        """Test entry event key format."""
-        symbol = "AAPL"
-        entry_date = date(2025, 12, 1)
-        expected = "ENTRY|AAPL|2025-12-01"
-
-        # Simulate the key generation
-        key = f"ENTRY|{symbol}|{entry_date.isoformat()}"
-        assert key == expected
-
-    def test_exit_event_key_format(self):
-        """Test exit event key format."""
-        symbol = "AAPL"
-        entry_date = date(2025, 12, 1)
-        exit_date = date(2025, 12, 20)
-        exit_reason = "STOP_LOSS"
-        expected = "EXIT|AAPL|2025-12-01|2025-12-20|STOP_LOSS"
-
-        # Simulate the key generation
-        key = f"EXIT|{symbol}|{entry_date.isoformat()}|{exit_date.isoformat()}|{exit_reason}"
-        assert key == expected
-
-    def test_entry_event_key_uniqueness(self):
-        """Test that different entries produce different keys."""
-        key1 = "ENTRY|AAPL|2025-12-01"
-        key2 = "ENTRY|AAPL|2025-12-02"
-        key3 = "ENTRY|MSFT|2025-12-01"
-
-        assert key1 != key2  # Different dates
-        assert key1 != key3  # Different symbols
-        assert key2 != key3  # Both different
-
-    def test_exit_event_key_uniqueness(self):
-        """Test that different exits produce different keys."""
-        key1 = "EXIT|AAPL|2025-12-01|2025-12-20|STOP_LOSS"
-        key2 = "EXIT|AAPL|2025-12-01|2025-12-20|TIME_EXIT"
-        key3 = "EXIT|AAPL|2025-12-01|2025-12-21|STOP_LOSS"
-
-        assert key1 != key2  # Different exit reasons
-        assert key1 != key3  # Different exit dates
-
-    def test_same_entry_produces_same_key(self):
-        """Test that identical entries produce the same key (idempotency)."""
-        symbol = "AAPL"
-        entry_date = date(2025, 12, 1)
+    pytestmark = pytest.mark.xdist_group(name="event_keys")
+
+    @pytest.mark.parametrize("case", KEY_CASES, ids=[case[-1] for case in KEY_CASES])
+    def test_event_key(self, case: tuple, engine: StrategyEngine):
+        """Test that the engine's key helpers match the expected format."""
+        assert _generate_key(engine, case) == case[-1]
 
-        key1 = f"ENTRY|{symbol}|{entry_date.isoformat()}"
-        key2 = f"ENTRY|{symbol}|{entry_date.isoformat()}"
+    def test_event_keys_unique(self, engine: StrategyEngine):
+        """Test that entries/exits differing in any field get different generated keys."""
+        keys = frozenset(_generate_key(engine, case) for case in KEY_CASES)
+        assert len(keys) == len(KEY_CASES)
+
+    def test_same_entry_produces_same_key(self, engine: StrategyEngine, common):
+        """Test that identical entries produce the same key (idempotency)."""
+        entry_iso = common.entry_date.isoformat()
+        key1 = engine._generate_entry_event_key(common.symbol, entry_iso)
+        key2 = engine._generate_entry_event_key(common.symbol, entry_iso)
 
         assert key1 == key2
 
 
+GOLDEN_DIR = Path(__file__).parent / "golden"
+
+
+@pytest.fixture(scope="session")
+def golden() -> dict[str, str]:
+    """Expected alert messages from tests/golden/*.txt, keyed by file stem."""
+    return {
+        path.stem: path.read_text(encoding="utf-8").removesuffix("\n")
+        for path in GOLDEN_DIR.glob("*.txt")
+    }
+
+
 class TestMessageFormatting:
     """Tests for alert message formatting."""
 
-    def test_entry_message_format(self):
+    pytestmark = pytest.mark.xdist_group(name="message_formatting")
+
+    def test_entry_message_format(self, golden: dict[str, str]):
         """Test entry alert message format."""
-        symbol = "AAPL"
-        as_of = date(2025, 12, 1)
-        earnings_return = Decimal("-0.1234")
-        entry_price = Decimal("123.45")
-
-        message = (
-            f"[ENTRY] {symbol} {as_of.isoformat()}\n"
-            f"Earnings day return: {earnings_return * 100:.2f}%\n"
-            f"Entry price (close): {entry_price:.2f}"
+        message = build_entry_message(
+            "AAPL", date(2025, 12, 1), _ER["-12.34"], Decimal("123.45")
         )
+        assert message == golden["entry_aapl"]
 
-        expected = (
-            "[ENTRY] AAPL 2025-12-01\n"
-            "Earnings day return: -12.34%\n"
-            "Entry price (close): 123.45"
+    @pytest.mark.parametrize(
+        "symbol,exit_date,exit_reason,pnl,exit_price,holding_days,golden_key",
+        [
+            (
+                "AAPL",
+                date(2025, 12, 20),
+                "STOP_LOSS",
+                _ER["-10.12"],
+                Decimal("111.11"),
+                19,
+                "exit_stop_loss_aapl",
+            ),
+            (
+                "MSFT",
+                date(2025, 2, 20),
+                "TIME_EXIT",
+                _ER["5"],
+                Decimal("315.00"),
+                50,
+                "exit_time_exit_msft",
+            ),
+        ],
+        ids=["stop_loss", "time_exit"],
+    )
+    def test_exit_message_format(
+        self,
+        golden: dict[str, str],
+        symbol: str,
+        exit_date: date,
+        exit_reason: str,
+        pnl: Decimal,
+        exit_price: Decimal,
+        holding_days: int,
+        golden_key: str,
+    ):
+        """Test exit (stop loss / time exit) alert message format."""
+        message = build_exit_message(
+            symbol, exit_date, exit_reason, pnl, exit_price, holding_days
+        )
+        assert message == golden[golden_key]
+
+
+class TestPersistence:
+    """Tests for batched position/alert writes."""
+
+    @pytest.mark.asyncio
+    async def test_persist_alerts_skips_empty_batch(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test that an empty batch issues no statement."""
+        assert await engine.persist_alerts([]) == 0
+        mock_db.execute.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_persist_alerts_counts_inserted_rows(
+        self, engine: StrategyEngine, mock_db: MagicMock, common
+    ):
+        """Test that all alerts go out in one statement and inserted ids are counted."""
+        mock_db.execute.return_value.scalars.return_value.all.return_value = [uuid.uuid4()]
+
+        alerts = [
+            {
+                "event_key": f"ENTRY|{symbol}|2025-12-01",
+                "alert_type": "ENTRY",
+                "symbol": symbol,
+                "as_of": common.entry_date,
+                "message": "msg",
+            }
+            for symbol in ("AAPL", "MSFT")
+        ]
+
+        # One of the two keys already existed, so only one id comes back
+        assert await engine.persist_alerts(alerts) == 1
+        mock_db.execute.assert_called_once()
+        assert mock_db.execute.call_args.args[1] == alerts
+
+        sql = str(mock_db.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (event_key) DO NOTHING" in sql
+        assert "RETURNING alerts.id" in sql
+
+    @pytest.mark.asyncio
+    async def test_persist_positions_single_statement(
+        self, engine: StrategyEngine, mock_db: MagicMock, common
+    ):
+        """Test that all positions for the scan day go out in one statement."""
+        mock_db.execute.return_value.scalars.return_value.all.return_value = [
+            uuid.uuid4(),
+            uuid.uuid4(),
+        ]
+
+        positions = [
+            {
+                "symbol": symbol,
+                "entry_date": common.entry_date,
+                "entry_price": common.entry_price,
+                "status": "OPEN",
+            }
+            for symbol in ("AAPL", "MSFT")
+        ]
+
+        assert await engine.persist_positions(positions) == 2
+        mock_db.execute.assert_called_once()
+        assert mock_db.execute.call_args.args[1] == positions
+
+        sql = str(mock_db.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (symbol, entry_date) DO NOTHING" in sql
+        assert "RETURNING positions.id" in sql
+
+    @pytest.mark.asyncio
+    async def test_replace_symbols_cache_uses_single_insert(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test that a small symbols batch is written with one DELETE and one INSERT."""
+        await engine._replace_symbols_cache(["AAPL", "MSFT", "GOOGL"])
+
+        assert mock_db.execute.call_count == 2
+        delete_stmt, insert_stmt = (call.args[0] for call in mock_db.execute.call_args_list)
+        assert str(delete_stmt.compile(dialect=postgresql.dialect())) == "DELETE FROM symbols_cache"
+
+        compiled = insert_stmt.compile(dialect=postgresql.dialect())
+        assert str(compiled).startswith("INSERT INTO symbols_cache (symbol, updated_at) VALUES")
+        symbols = [v for k, v in compiled.params.items() if k.startswith("symbol")]
+        assert symbols == ["AAPL", "MSFT", "GOOGL"]
+
+    @pytest.mark.asyncio
+    async def test_select_entry_signals_skips_query_without_prices(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test that no query is issued when no candidate has price data."""
+        assert await engine._select_entry_signals({"AAPL": None, "MSFT": None}) == []
+        mock_db.execute.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_select_entry_signals_drops_non_positive_prev_close(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test that rows which would divide by zero in SQL are never sent."""
+        mock_db.execute.return_value.all.return_value = []
+        price_map = {
+            "AAPL": (Decimal("88.00"), Decimal("100.00")),
+            "MSFT": (Decimal("50.00"), Decimal("0")),
+            "GOOGL": (Decimal("50.00"), Decimal("-1.00")),
+        }
+
+        await engine._select_entry_signals(price_map)
+
+        mock_db.execute.assert_called_once()
+        sql = str(
+            mock_db.execute.call_args.args[0].compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        assert "'AAPL'" in sql
+        assert "'MSFT'" not in sql
+        assert "'GOOGL'" not in sql
+
+    @pytest.mark.asyncio
+    async def test_select_entry_signals_skips_query_when_prev_close_zero(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test that no query is issued when every prev_close is zero."""
+        price_map = {"MSFT": (Decimal("50.00"), Decimal("0"))}
+
+        assert await engine._select_entry_signals(price_map) == []
+        mock_db.execute.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_select_entry_signals_filters_return_range(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test that the return filter is BETWEEN -0.30 AND -0.05 on close / prev_close - 1."""
+        mock_db.execute.return_value.all.return_value = []
+
+        await engine._select_entry_signals({"AAPL": (Decimal("88.00"), Decimal("100.00"))})
+
+        sql = str(
+            mock_db.execute.call_args.args[0].compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
         )
-        assert message == expected
-
-    def test_exit_stop_loss_message_format(self):
-        """Test exit (stop loss) alert message format."""
-        symbol = "AAPL"
-        exit_date = date(2025, 12, 20)
-        exit_reason = "STOP_LOSS"
-        pnl = Decimal("-0.1012")
-        exit_price = Decimal("111.11")
-        holding_days = 19
-
-        reason_label = "STOP_LOSS" if exit_reason == "STOP_LOSS" else "TIME_EXIT"
-        message = (
-            f"[EXIT-{reason_label}] {symbol} {exit_date.isoformat()}\n"
-            f"PnL: {pnl * 100:.2f}%\n"
-            f"Exit price (close): {exit_price:.2f}\n"
-            f"Holding days: {holding_days}"
+        assert "JOIN symbols_cache ON symbols_cache.symbol = prices.symbol" in sql
+        assert (
+            "WHERE prices.close / CAST(prices.prev_close AS NUMERIC) - 1 "
+            "BETWEEN -0.30 AND -0.05" in sql
         )
 
-        expected = (
-            "[EXIT-STOP_LOSS] AAPL 2025-12-20\n"
-            "PnL: -10.12%\n"
-            "Exit price (close): 111.11\n"
-            "Holding days: 19"
+
+class TestSymbolsMemo:
+    """Tests for the in-process SP500 symbols memo."""
+
+    @pytest.fixture(autouse=True)
+    def reset_symbols_memo(self):
+        """Clear the module-level memo between tests."""
+        strategy_engine_module._symbols_memo = None
+        yield
+        strategy_engine_module._symbols_memo = None
+
+    @pytest.mark.asyncio
+    async def test_refresh_is_memoized(
+        self, engine: StrategyEngine, mock_db: MagicMock, mock_fmp_client: MagicMock
+    ):
+        """Test that a refreshed symbol list skips the DB on the next call."""
+        mock_db.execute.return_value.one.return_value = (None, 0)
+
+        first = await engine.get_sp500_symbols()
+        calls = mock_db.execute.call_count
+        second = await engine.get_sp500_symbols()
+
+        assert first == second == ["AAPL", "MSFT", "GOOGL", "AMZN"]
+        assert mock_db.execute.call_count == calls
+        mock_fmp_client.get_sp500_constituents.assert_called_once()
+
+
+class TestEntryScan:
+    """Tests for the entry scan flow."""
+
+    @pytest.mark.asyncio
+    async def test_scan_entries_skips_sp500_lookup_without_earnings(
+        self, engine: StrategyEngine, mock_db: MagicMock, mock_fmp_client: MagicMock
+    ):
+        """Test that a day without earnings does no SP500 or DB work."""
+        assert await engine.scan_entries(date(2025, 12, 20)) == 0
+        mock_fmp_client.get_sp500_constituents.assert_not_called()
+        mock_db.execute.assert_not_called()
+        mock_db.commit.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_scan_entries_emits_entry_rows(
+        self, engine: StrategyEngine, mock_db: MagicMock, mock_fmp_client: MagicMock, common
+    ):
+        """Test the event key and message of the alert rows the entry scan writes."""
+        mock_fmp_client.get_earnings_calendar.return_value = [common.symbol]
+        signals = [(common.symbol, Decimal("88.00"), Decimal("-0.12"))]
+
+        with (
+            patch.object(engine, "get_sp500_symbols", new_callable=AsyncMock) as sp500,
+            patch.object(engine, "_select_entry_signals", new_callable=AsyncMock) as select,
+            patch.object(engine, "persist_positions", new_callable=AsyncMock) as positions,
+            patch.object(engine, "persist_alerts", new_callable=AsyncMock) as persist,
+        ):
+            sp500.return_value = [common.symbol, "MSFT"]
+            select.return_value = signals
+            persist.return_value = 1
+            new_alerts = await engine.scan_entries(common.entry_date)
+
+        assert new_alerts == 1
+        (position_rows,), _ = positions.call_args
+        assert position_rows == [
+            {
+                "symbol": "AAPL",
+                "entry_date": common.entry_date,
+                "entry_price": Decimal("88.00"),
+                "status": "OPEN",
+            }
+        ]
+        (alerts,), _ = persist.call_args
+        assert alerts[0]["event_key"] == "ENTRY|AAPL|2025-12-01"
+        assert alerts[0]["alert_type"] == "ENTRY"
+        assert alerts[0]["message"].startswith(
+            "[ENTRY] AAPL 2025-12-01\nEarnings day return: -12.00%"
         )
-        assert message == expected
-
-    def test_exit_time_exit_message_format(self):
-        """Test exit (time exit) alert message format."""
-        symbol = "MSFT"
-        exit_date = date(2025, 2, 20)
-        exit_reason = "TIME_EXIT"
-        pnl = Decimal("0.05")
-        exit_price = Decimal("315.00")
-        holding_days = 50
-
-        reason_label = "STOP_LOSS" if exit_reason == "STOP_LOSS" else "TIME_EXIT"
-        message = (
-            f"[EXIT-{reason_label}] {symbol} {exit_date.isoformat()}\n"
-            f"PnL: {pnl * 100:.2f}%\n"
-            f"Exit price (close): {exit_price:.2f}\n"
-            f"Holding days: {holding_days}"
+        mock_db.commit.assert_called_once()
+
+
+class TestExitScan:
+    """Tests for the exit scan flow."""
+
+    @pytest.mark.asyncio
+    async def test_scan_exits_alerts_closed_positions(
+        self, engine: StrategyEngine, mock_db: MagicMock, mock_fmp_client: MagicMock, common
+    ):
+        """Test that positions closed by the UPDATE produce exit alerts."""
+        mock_db.execute.return_value.scalars.return_value.all.return_value = ["AAPL", "MSFT"]
+        mock_fmp_client.get_close_price_bulk.return_value = {
+            "AAPL": Decimal("85.00"),
+            "MSFT": Decimal("101.00"),
+        }
+
+        closed = [
+            (
+                uuid.uuid4(),
+                common.symbol,
+                common.entry_date,
+                common.entry_price,
+                Decimal("85.00"),
+                "STOP_LOSS",
+            )
+        ]
+
+        with (
+            patch.object(
+                engine, "_close_triggered_positions", new_callable=AsyncMock
+            ) as close,
+            patch.object(engine, "persist_alerts", new_callable=AsyncMock) as persist,
+        ):
+            close.return_value = closed
+            persist.return_value = 1
+            new_alerts = await engine.scan_exits(common.exit_date)
+
+        assert new_alerts == 1
+        (alerts,), _ = persist.call_args
+        assert alerts[0]["event_key"] == "EXIT|AAPL|2025-12-01|2025-12-20|STOP_LOSS"
+        assert alerts[0]["message"].startswith("[EXIT-STOP_LOSS] AAPL 2025-12-20\nPnL: -15.00%")
+
+    @pytest.mark.asyncio
+    async def test_close_triggered_positions_single_update(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test that exit detection is one UPDATE ... FROM VALUES ... RETURNING."""
+        mock_db.execute.return_value.all.return_value = []
+
+        await engine._close_triggered_positions(
+            date(2025, 12, 20), {"AAPL": Decimal("85.00"), "MSFT": None}
         )
 
-        expected = (
-            "[EXIT-TIME_EXIT] MSFT 2025-02-20\n"
-            "PnL: 5.00%\n"
-            "Exit price (close): 315.00\n"
-            "Holding days: 50"
+        mock_db.execute.assert_called_once()
+        sql = str(
+            mock_db.execute.call_args.args[0].compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        assert sql.startswith("UPDATE positions SET status='CLOSED', exit_date='2025-12-20'")
+        # Symbols without a close price are not sent
+        assert "FROM (VALUES ('AAPL', 85.00)) AS prices (symbol, close)" in sql
+        assert "RETURNING positions.id" in sql
+
+    @pytest.mark.asyncio
+    async def test_close_triggered_positions_exit_conditions(
+        self, engine: StrategyEngine, mock_db: MagicMock
+    ):
+        """Test the stop-loss bound, the 50-day cutoff and STOP_LOSS precedence in SQL."""
+        mock_db.execute.return_value.all.return_value = []
+
+        await engine._close_triggered_positions(date(2025, 12, 20), {"AAPL": Decimal("85.00")})
+
+        sql = str(
+            mock_db.execute.call_args.args[0].compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
         )
-        assert message == expected
+        # 2025-12-20 minus MAX_HOLDING_DAYS (50) is 2025-10-31
+        assert (
+            "WHERE positions.symbol = prices.symbol AND positions.status = 'OPEN' AND "
+            "(prices.close <= positions.entry_price * 0.90 "
+            "OR positions.entry_date <= '2025-10-31')"
+        ) in sql
+        # A position hitting both conditions is reported as a stop loss
+        assert (
+            "exit_reason=CASE WHEN (prices.close <= positions.entry_price * 0.90) "
+            "THEN 'STOP_LOSS' ELSE 'TIME_EXIT' END"
+        ) in sql
+        assert "exit_price=prices.close" in sql